@@ -1,21 +1,98 @@
 import streamlit as st
-import json
 import os
 import random
+import shutil
+import tempfile
+import threading
 from datetime import datetime
-import pandas as pd
-import matplotlib.pyplot as plt
-
+import numpy as np
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = lambda obj: orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    _dumps_line = lambda obj: orjson.dumps(obj) + b"\n"
+except ImportError:
+    import json
+
+    @st.cache_resource
+    def _json_codecs():
+        """Shared decoder/encoders, so json.loads/dumps don't rebuild them per call."""
+        return json.JSONDecoder(), json.JSONEncoder(indent=2), json.JSONEncoder()
+
+    _DEC, _ENC, _ENC_LINE = _json_codecs()
+    _loads = lambda data: _DEC.decode(data.decode())
+    _dumps = lambda obj: _ENC.encode(obj).encode()
+    _dumps_line = lambda obj: _ENC_LINE.encode(obj).encode() + b"\n"
 
 # -----------------------
 # Constants & File paths
 # -----------------------
 QUESTIONS_FILE = "questions.json"
-RESULTS_FILE = "results.json"
+RESULTS_FILE = "results.jsonl"
+LEGACY_RESULTS_FILE = "results.json"
 
 # -----------------------
 # Helper functions
 # -----------------------
+def _atomic_write_bytes(path, data):
+    """Write via a temp file + rename so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        else:
+            # mkstemp creates 0600; give new files the usual open() mode
+            os.chmod(tmp, 0o666 & ~_umask())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+@st.cache_resource
+def _umask():
+    """Process umask, read once (os.umask can only be read by setting it)."""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+@st.cache_resource
+def _results_lock():
+    """Process-wide lock around results-log appends and tail repair."""
+    return threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def _repair_results_tail():
+    """Fix a last results line that lacks its newline; runs once per process.
+
+    A complete record just gets its newline back; a partial one left by an
+    interrupted append is truncated and a warning message is returned.
+    """
+    with _results_lock():
+        with open(RESULTS_FILE, "rb") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return None
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return None
+            f.seek(0)
+            data = f.read()
+        cut = data.rfind(b"\n") + 1
+        try:
+            _loads(data[cut:])
+        except ValueError:
+            with open(RESULTS_FILE, "rb+") as f:
+                f.truncate(cut)
+            return f"Dropped an incomplete last record from {RESULTS_FILE}."
+        with open(RESULTS_FILE, "ab") as f:
+            f.write(b"\n")
+        return None
+
 def ensure_files_exist():
     """Create default question file and results file if missing."""
     if not os.path.exists(QUESTIONS_FILE):
@@ -42,60 +119,152 @@ def ensure_files_exist():
                 "answer": "H2O"
             }
         ]
-        with open(QUESTIONS_FILE, "w") as f:
-            json.dump(default_questions, f, indent=2)
+        _atomic_write_bytes(QUESTIONS_FILE, _dumps(default_questions))
 
     if not os.path.exists(RESULTS_FILE):
-        with open(RESULTS_FILE, "w") as f:
-            json.dump([], f, indent=2)
+        # One-shot migration from the old JSON array to one result per line
+        legacy = []
+        if os.path.exists(LEGACY_RESULTS_FILE):
+            with open(LEGACY_RESULTS_FILE, "rb") as f:
+                try:
+                    legacy = _loads(f.read())
+                except ValueError as e:
+                    st.warning(f"Could not migrate {LEGACY_RESULTS_FILE} ({e}); "
+                               f"starting a new results log and leaving the old file in place.")
+        _atomic_write_bytes(RESULTS_FILE, b"".join(_dumps_line(r) for r in legacy))
+    else:
+        msg = _repair_results_tail()
+        if msg and not st.session_state.get("results_repair_reported"):
+            st.session_state["results_repair_reported"] = True
+            st.warning(msg)
+
+def _questions_to_soa(qs):
+    """Column-wise view of the fields used on hot paths, in file order.
+
+    Categories are stored as sorted unique names plus per-question codes
+    (NumPy only, so the quiz path does not need pandas). Text fields stay in
+    the question dicts. The arrays are shared, so they are made read-only.
+    """
+    categories, category_codes = np.unique(np.array([q["category"] for q in qs], dtype=object),
+                                           return_inverse=True)
+    soa = {
+        "ids": np.array([q["id"] for q in qs], dtype=np.uint32),
+        "categories": categories,
+        "category_codes": category_codes,
+        # position of the correct answer within its choices (-1 if missing)
+        "answer_idx": np.array([q["choices"].index(q["answer"]) if q["answer"] in q["choices"] else -1
+                                for q in qs], dtype=np.int16),
+    }
+    for arr in soa.values():
+        arr.flags.writeable = False
+    return soa
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _load_questions_cached(mtime):
+    """Parse the question file; keyed by its mtime so edits invalidate it."""
+    with open(QUESTIONS_FILE, "rb") as f:
+        return _loads(f.read())
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _question_meta_cached(mtime, _qs):
+    """Read-only lookups derived from the question file.
+
+    Built from the caller's own question list (not hashed, hence the
+    underscore) so the lookups always match it. Unlike st.cache_data,
+    st.cache_resource hands back the same object on every call instead of
+    an unpickled copy, so callers must not mutate it.
+    Returns (soa, id_to_index, labels_to_id).
+    """
+    qs = _qs
+    soa = _questions_to_soa(qs)
+    id_to_index = {q["id"]: i for i, q in enumerate(qs)}
+    labels_to_id = tuple((f"{q['id']}: {q['question'][:50]}", q["id"]) for q in qs)
+    return soa, id_to_index, labels_to_id
 
 def load_questions():
     """Return list of question dicts."""
-    with open(QUESTIONS_FILE, "r") as f:
-        return json.load(f)
+    return _load_questions_cached(os.path.getmtime(QUESTIONS_FILE))
+
+def load_question_bank():
+    """Return (questions, soa, id_to_index, labels_to_id) from one version of the file.
+
+    The mtime is read once so the list and its lookups can't come from two
+    different saves.
+    """
+    mtime = os.path.getmtime(QUESTIONS_FILE)
+    qs = _load_questions_cached(mtime)
+    return (qs, *_question_meta_cached(mtime, qs))
+
+def _clear_question_caches():
+    _load_questions_cached.clear()
+    _question_meta_cached.clear()
 
 def save_questions(qs):
     """Persist list of questions to file."""
-    with open(QUESTIONS_FILE, "w") as f:
-        json.dump(qs, f, indent=2)
+    _atomic_write_bytes(QUESTIONS_FILE, _dumps(qs))
+    _clear_question_caches()
     st.success("Question bank saved.")
 
 def load_results():
-    with open(RESULTS_FILE, "r") as f:
-        return json.load(f)
+    with open(RESULTS_FILE, "rb") as f:
+        return [_loads(line) for line in f if line.strip()]
 
 def save_result(result):
-    results = load_results()
-    results.append(result)
-    with open(RESULTS_FILE, "w") as f:
-        json.dump(results, f, indent=2)
+    """Append one result and return the updated results list."""
+    with _results_lock(), open(RESULTS_FILE, "ab") as f:
+        f.write(_dumps_line(result))
     st.success("Result saved.")
+    return load_results()
 
-def generate_id(qs):
-    if not qs:
-        return 1
-    return max(q["id"] for q in qs) + 1
+def generate_id(soa):
+    ids = soa["ids"]
+    return int(ids.max()) + 1 if len(ids) else 1
 
-def get_categories(qs):
-    cats = sorted(list({q["category"] for q in qs}))
-    return cats
+def get_categories(soa):
+    return soa["categories"].tolist()
+
+def question_positions(soa, category):
+    """Return positions in the question list of questions in category ("All" for every one)."""
+    codes = soa["category_codes"]
+    if category == "All":
+        return np.arange(len(codes))
+    match = np.flatnonzero(soa["categories"] == category)
+    if not len(match):
+        return match
+    return np.flatnonzero(codes == match[0])
 
 def quiz_session_reset():
     st.session_state["current_q_index"] = 0
     st.session_state["score"] = 0
-    st.session_state["answers"] = []
+    st.session_state["answers"] = {}
+
+def session_figure(key):
+    """Return a (fig, ax) pair reused across reruns, with the axes cleared.
+
+    Built with Figure() rather than pyplot so the figure is owned by this
+    session only and is not kept alive by pyplot's global figure manager.
+    """
+    from matplotlib.figure import Figure
+    if key not in st.session_state:
+        fig = Figure()
+        st.session_state[key] = fig, fig.subplots()
+    fig, ax = st.session_state[key]
+    ax.clear()
+    return fig, ax
+
+_GRADE_THRESHOLDS = np.array([50.0, 70.0, 85.0])
+_GRADES = np.array(["D", "C", "B", "A"])
+
+def calc_grades_vec(scores, totals):
+    """Vectorized calculate_grade: return (pct array, grade array)."""
+    scores = np.asarray(scores, dtype=np.float64)
+    totals = np.asarray(totals, dtype=np.float64)
+    pct = np.divide(scores * 100.0, totals, out=np.zeros_like(scores), where=totals > 0)
+    return pct, _GRADES[np.searchsorted(_GRADE_THRESHOLDS, pct, side="right")]
 
 def calculate_grade(score, total):
-    pct = (score / total) * 100 if total > 0 else 0
-    if pct >= 85:
-        grade = "A"
-    elif pct >= 70:
-        grade = "B"
-    elif pct >= 50:
-        grade = "C"
-    else:
-        grade = "D"
-    return pct, grade
+    pct, grades = calc_grades_vec([score], [total])
+    return float(pct[0]), str(grades[0])
 
 # -----------------------
 # Layout parts
@@ -111,31 +280,28 @@ def flash_screen():
 
 def take_quiz():
     st.header("📝 Take Quiz")
-    qs = load_questions()
+    qs, soa, _, _ = load_question_bank()
     if not qs:
         st.warning("No questions available. Please add questions in 'Edit Questions'.")
         return
 
-    categories = ["All"] + get_categories(qs)
+    categories = ["All", *get_categories(soa)]
     category = st.selectbox("Choose category", categories)
 
     num_questions = st.slider("Number of questions", min_value=1, max_value=min(20, len(qs)), value=min(5, len(qs)))
     shuffle = st.checkbox("Shuffle questions", value=True)
 
     # Filter questions
-    if category == "All":
-        pool = qs.copy()
-    else:
-        pool = [q for q in qs if q["category"] == category]
+    pool = question_positions(soa, category)
 
-    if not pool:
+    if not len(pool):
         st.warning("No questions in this category.")
         return
 
-    if shuffle:
-        random.shuffle(pool)
-
-    selected_questions = pool[:num_questions]
+    k = min(num_questions, len(pool))
+    picked = pool[random.sample(range(len(pool)), k)] if shuffle else pool[:k]
+    selected_questions = [qs[i] for i in picked]
+    answer_idxs = soa["answer_idx"][picked]
 
     # initialize session state
     if "quiz_running" not in st.session_state or st.session_state.get("last_pool") != [q["id"] for q in selected_questions]:
@@ -144,13 +310,19 @@ def take_quiz():
         quiz_session_reset()
         st.session_state["start_time"] = datetime.now().isoformat()
 
+    _render_question(selected_questions, answer_idxs, category)
+
+@st.fragment
+def _render_question(selected_questions, answer_idxs, category):
+    """Current question, answer buttons and finish block; reruns on its own."""
     q_index = st.session_state.get("current_q_index", 0)
 
     # Display current question
     q = selected_questions[q_index]
     st.subheader(f"Question {q_index + 1} of {len(selected_questions)}")
     st.write(f"*{q['question']}*")
-    choice = st.radio("Choose an answer", q["choices"], key=f"choice_{q['id']}")
+    choice_idx = st.radio("Choose an answer", range(len(q["choices"])),
+                          format_func=q["choices"].__getitem__, key=f"choice_{q['id']}")
 
     cols = st.columns([1,1,1])
     with cols[0]:
@@ -158,13 +330,12 @@ def take_quiz():
             st.session_state["current_q_index"] -= 1
     with cols[1]:
         if st.button("Submit Answer"):
-            st.session_state["answers"] = st.session_state.get("answers", [])
-            # store tuple (q_id, selected_choice, correct)
-            correct = choice == q["answer"]
+            answers = st.session_state.setdefault("answers", {})
+            # store q_id -> (selected_choice_index, selected_choice, correct)
+            correct = choice_idx == int(answer_idxs[q_index])
             # update score only if this question hasn't been answered yet
-            already = next((a for a in st.session_state["answers"] if a[0] == q["id"]), None)
-            if already is None:
-                st.session_state["answers"].append((q["id"], choice, correct))
+            if q["id"] not in answers:
+                answers[q["id"]] = (choice_idx, q["choices"][choice_idx], correct)
                 if correct:
                     st.session_state["score"] = st.session_state.get("score", 0) + 1
                     st.success("Correct!")
@@ -192,22 +363,25 @@ def take_quiz():
                 "pct": pct,
                 "grade": grade,
                 "category": category,
-                "answers": st.session_state.get("answers", [])
+                # (q_id, choice text, correct, choice index); the text survives later edits
+                "answers": [(qid, choice, correct, idx)
+                            for qid, (idx, choice, correct) in st.session_state.get("answers", {}).items()]
             }
-            save_result(result)
+            results = save_result(result)
             st.session_state["quiz_running"] = False
 
             # Show progress chart
             st.write("### Progress chart (Last results)")
-            results = load_results()
+            import pandas as pd
             df = pd.DataFrame(results)
             if not df.empty:
                 # show last 10 attempts
-                df_recent = df.tail(10)
-                fig, ax = plt.subplots()
+                df_recent = df.tail(10).copy()
+                df_recent["date_str"] = df_recent["timestamp"].str.slice(0, 10)
+                fig, ax = session_figure("progress_fig")
                 ax.plot(range(len(df_recent)), df_recent["pct"].astype(float), marker="o")
                 ax.set_xticks(range(len(df_recent)))
-                ax.set_xticklabels([d.split("T")[0] for d in df_recent["timestamp"]], rotation=45)
+                ax.set_xticklabels(df_recent["date_str"].tolist(), rotation=45)
                 ax.set_ylabel("Percentage")
                 ax.set_ylim(0, 100)
                 ax.set_title("Last attempts (%)")
@@ -217,21 +391,20 @@ def take_quiz():
 
 def display_questions():
     st.header("📚 Display Questions")
-    qs = load_questions()
+    qs, soa, _, _ = load_question_bank()
     if not qs:
         st.warning("No questions available.")
         return
 
-    df = pd.DataFrame(qs)
-    st.dataframe(df[["id","category","question","choices","answer"]])
+    import pandas as pd
+    df = pd.DataFrame(qs, columns=["id","category","question","choices","answer"])
+    df["category"] = pd.Categorical.from_codes(soa["category_codes"], soa["categories"])
+    st.dataframe(df)
 
     # Optional: filter and view
-    category = st.selectbox("Filter by category", ["All"] + get_categories(qs))
+    category = st.selectbox("Filter by category", ["All", *get_categories(soa)])
     if st.button("Apply Filter"):
-        if category == "All":
-            filtered = qs
-        else:
-            filtered = [q for q in qs if q["category"] == category]
+        filtered = [qs[i] for i in question_positions(soa, category)]
         st.write(f"Showing {len(filtered)} question(s).")
         for q in filtered:
             st.markdown(f"*{q['id']}. [{q['category']}] {q['question']}*")
@@ -241,24 +414,33 @@ def display_questions():
 
 def view_results():
     st.header("📈 View Results")
-    results = load_results()
-    if not results:
+    import pandas as pd
+    df = None
+    if os.path.getsize(RESULTS_FILE) > 0:
+        # Parse the JSON lines straight into typed columns
+        df = pd.read_json(RESULTS_FILE, lines=True, convert_dates=["timestamp"],
+                          dtype={"score": "uint16", "total": "uint16", "pct": "float32"})
+    if df is None or df.empty:
         st.info("No results yet. Take a quiz to generate results.")
         return
-    df = pd.DataFrame(results)
+    df["date_str"] = df["timestamp"].dt.strftime("%Y-%m-%d")
+    # Recompute every grade from score/total in one pass
+    df["grade"] = pd.Categorical(calc_grades_vec(df["score"], df["total"])[1], categories=_GRADES)
+    df = df.astype({"category": "category"})
+    pct = df["pct"].to_numpy()
     st.dataframe(df[["timestamp","score","total","pct","grade","category"]])
 
     # Summary stats
     st.write("### Summary")
-    avg_pct = df["pct"].astype(float).mean()
-    best = df.loc[df["pct"].astype(float).idxmax()]
+    avg_pct = pct.mean()
+    best = df.iloc[int(pct.argmax())]
     st.write(f"- Attempts: {len(df)}")
     st.write(f"- Average %: {avg_pct:.2f}")
-    st.write(f"- Best: {best['pct']}% on {best['timestamp'].split('T')[0]} (Grade: {best['grade']})")
+    st.write(f"- Best: {best['pct']}% on {best['date_str']} (Grade: {best['grade']})")
 
     # Plot distribution
-    fig, ax = plt.subplots()
-    ax.hist(df["pct"].astype(float), bins=8)
+    fig, ax = session_figure("hist_fig")
+    ax.hist(pct, bins=8)
     ax.set_xlabel("Percentage")
     ax.set_ylabel("Count")
     ax.set_title("Distribution of Scores (%)")
@@ -270,7 +452,7 @@ def view_results():
 
 def edit_questions():
     st.header("✏️ Edit Questions (Add / Edit / Delete)")
-    qs = load_questions()
+    qs, soa, id_to_index, labels_to_id = load_question_bank()
     mode = st.radio("Mode", ["Add Question", "Edit Existing", "Delete Question", "Bulk Reset to Default"])
 
     if mode == "Add Question":
@@ -287,7 +469,7 @@ def edit_questions():
                 elif answer not in choices:
                     st.error("Answer must match one of the choices exactly.")
                 else:
-                    new_id = generate_id(qs)
+                    new_id = generate_id(soa)
                     new_q = {"id": new_id, "category": category, "question": question, "choices": choices, "answer": answer}
                     qs.append(new_q)
                     save_questions(qs)
@@ -297,10 +479,10 @@ def edit_questions():
         if not qs:
             st.warning("No questions to edit.")
             return
-        options = {f"{q['id']}: {q['question'][:50]}": q["id"] for q in qs}
-        sel = st.selectbox("Select question to edit", list(options.keys()))
+        options = dict(labels_to_id)
+        sel = st.selectbox("Select question to edit", list(options.keys()), key="edit_q_select")
         qid = options[sel]
-        q = next(q for q in qs if q["id"] == qid)
+        q = qs[id_to_index[qid]]
         with st.form("edit_q_form"):
             category = st.text_input("Category", value=q["category"])
             question = st.text_area("Question", value=q["question"])
@@ -323,8 +505,8 @@ def edit_questions():
         if not qs:
             st.warning("No questions to delete.")
             return
-        options = {f"{q['id']}: {q['question'][:50]}": q["id"] for q in qs}
-        sel = st.selectbox("Select question to delete", list(options.keys()))
+        options = dict(labels_to_id)
+        sel = st.selectbox("Select question to delete", list(options.keys()), key="delete_q_select")
         qid = options[sel]
         if st.button("Delete"):
             new_qs = [q for q in qs if q["id"] != qid]
@@ -337,6 +519,7 @@ def edit_questions():
             if os.path.exists(QUESTIONS_FILE):
                 os.remove(QUESTIONS_FILE)
             ensure_files_exist()
+            _clear_question_caches()
             st.success("Question bank reset to default.")
 
 # -----------------------